@@ -296,7 +296,7 @@ if [ "$SKIP_DATA_UPLOAD" = false ]; then
         if ! python3 -c "import snowflake.snowpark" 2>/dev/null; then
             echo -e "${YELLOW}⚠️  Warning: snowflake-snowpark-python not installed${NC}"
             echo "  Installing required packages..."
-            pip3 install snowflake-snowpark-python pandas scikit-learn --quiet
+            pip3 install snowflake-snowpark-python pandas scikit-learn numba --quiet
         fi
 
         # Run the upload script with connection name
@@ -8,9 +8,12 @@ and writes them to Snowflake using bulk operations.
 """
 
 import argparse
+import concurrent.futures
 import os
 import sys
-import base64
+from io import BytesIO
+from pathlib import Path
+import numpy as np
 import pandas as pd
 from sklearn.model_selection import train_test_split
 
@@ -22,12 +25,23 @@ except ImportError:
     print("  Install it using: pip install snowflake-snowpark-python")
     sys.exit(1)
 
+# Optional Numba JIT for the label parser; the pandas read_csv path is
+# used when numba is not installed
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
 # Snowflake configuration
 DATABASE = 'PCB_CV'
 SCHEMA = 'PUBLIC'
 ROLE = 'PCB_CV_ROLE'
 WAREHOUSE = 'PCB_CV_WH'
 
+# Tables whose parquet payload exceeds this are staged and loaded with
+# COPY INTO instead of going through write_pandas
+PARQUET_THRESHOLD_BYTES = 3 * 1024 * 1024
+
 
 def parse_arguments():
     """Parse command-line arguments."""
@@ -85,152 +99,307 @@ def create_session(connection_name):
         sys.exit(1)
 
 
-def find_and_parse_labels(data_dir):
+if njit is not None:
+    @njit(cache=True)
+    def _parse_label_buffer(buf, file_offsets, out_xyxy, out_cls, out_file_idx):
+        """
+        Scan a concatenated label-file byte buffer, writing boxes straight
+        into the preallocated output arrays.
+
+        Expects "xmin ymin xmax ymax class" rows; rows containing anything
+        that does not parse as a number are skipped, matching the pandas
+        fallback path.
+
+        Returns:
+            Number of boxes parsed
+        """
+        n = 0
+        max_rows = out_cls.shape[0]
+        for f in range(file_offsets.shape[0] - 1):
+            i = file_offsets[f]
+            end = file_offsets[f + 1]
+            while i < end and n < max_rows:
+                # Skip whitespace between rows
+                while i < end and (buf[i] == 32 or buf[i] == 9 or buf[i] == 10 or buf[i] == 13):
+                    i += 1
+                if i >= end:
+                    break
+                # Parse the five numbers of one row; a field with no digits
+                # marks the row as malformed
+                row_ok = True
+                for col in range(5):
+                    neg = False
+                    if i < end and buf[i] == 45:
+                        neg = True
+                        i += 1
+                    val = 0.0
+                    digits = 0
+                    while i < end and 48 <= buf[i] <= 57:
+                        val = val * 10.0 + (buf[i] - 48)
+                        digits += 1
+                        i += 1
+                    if i < end and buf[i] == 46:
+                        i += 1
+                        scale = 0.1
+                        while i < end and 48 <= buf[i] <= 57:
+                            val += (buf[i] - 48) * scale
+                            scale *= 0.1
+                            digits += 1
+                            i += 1
+                    if digits == 0:
+                        row_ok = False
+                        break
+                    if neg:
+                        val = -val
+                    if col < 4:
+                        out_xyxy[n, col] = val
+                    else:
+                        out_cls[n] = int(val)
+                    # Skip spaces between fields
+                    while i < end and (buf[i] == 32 or buf[i] == 9):
+                        i += 1
+                if row_ok:
+                    out_file_idx[n] = f
+                    n += 1
+                else:
+                    # Skip the rest of the malformed line so the scan always
+                    # makes forward progress
+                    while i < end and buf[i] != 10:
+                        i += 1
+        return n
+
+
+def _parse_label_files_numba(label_entries):
     """
-    Walk through PCBData directory, find label files, and parse them into a DataFrame.
-    
+    Parse label files with the Numba byte-scanning kernel.
+
+    All files are concatenated into one buffer with an offsets array, so
+    the Python-level work is one read per file plus the final DataFrame
+    assembly; the per-character parsing runs as compiled code.
+
     Args:
-        data_dir: Path to PCBData directory
-    
+        label_entries: List of (txt_path, filename_base) tuples
+
+    Returns:
+        pandas DataFrame with columns: filename, xmin, ymin, xmax, ymax, class
+    """
+    buffers = [Path(txt_path).read_bytes() for txt_path, _ in label_entries]
+    offsets = np.zeros(len(buffers) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(b) for b in buffers])
+    buf = np.frombuffer(b''.join(buffers), dtype=np.uint8)
+
+    # One box per line; the extra len(buffers) covers missing final newlines
+    max_rows = int((buf == 10).sum()) + len(buffers)
+    out_xyxy = np.empty((max_rows, 4), dtype=np.float32)
+    out_cls = np.empty(max_rows, dtype=np.int16)
+    out_file_idx = np.empty(max_rows, dtype=np.int64)
+
+    n = _parse_label_buffer(buf, offsets, out_xyxy, out_cls, out_file_idx)
+
+    filenames = np.array([filename_base for _, filename_base in label_entries], dtype=object)
+    return pd.DataFrame({
+        'filename': filenames[out_file_idx[:n]],
+        'xmin': out_xyxy[:n, 0],
+        'ymin': out_xyxy[:n, 1],
+        'xmax': out_xyxy[:n, 2],
+        'ymax': out_xyxy[:n, 3],
+        'class': out_cls[:n]
+    })
+
+
+def _parse_label_files(label_entries):
+    """
+    Parse label files into a single DataFrame.
+
+    Uses the Numba byte-scanning kernel when numba is installed and falls
+    back to the pandas C parser otherwise.
+
+    Args:
+        label_entries: List of (txt_path, filename_base) tuples
+
     Returns:
         pandas DataFrame with columns: filename, xmin, ymin, xmax, ymax, class
     """
+    columns = ['xmin', 'ymin', 'xmax', 'ymax', 'class']
+
+    if not label_entries:
+        return pd.DataFrame(columns=['filename'] + columns)
+
+    if njit is not None:
+        return _parse_label_files_numba(label_entries)
+
+    dtypes = {'xmin': 'float32', 'ymin': 'float32', 'xmax': 'float32',
+              'ymax': 'float32', 'class': 'int16'}
+
+    frames = []
+    for txt_path, filename_base in label_entries:
+        try:
+            frames.append(
+                pd.read_csv(txt_path, sep=r'\s+', header=None,
+                            names=columns, dtype=dtypes)
+                .assign(filename=filename_base)
+            )
+        except pd.errors.EmptyDataError:
+            continue
+
+    if not frames:
+        return pd.DataFrame(columns=['filename'] + columns)
+
+    labels_df = pd.concat(frames, ignore_index=True, copy=False)
+    return labels_df[['filename'] + columns]
+
+
+def _read_image(image_entry):
+    """
+    Read a single image file as raw JPEG bytes.
+
+    Args:
+        image_entry: Tuple of (filename_base, jpg_path)
+
+    Returns:
+        Dict with Filename and image_data keys, or None if the read failed
+    """
+    filename_base, jpg_path = image_entry
+    try:
+        # Path.read_bytes reads the whole file with fewer syscalls than
+        # open + read + close
+        return {
+            'Filename': filename_base + "_test",
+            'image_data': Path(jpg_path).read_bytes()
+        }
+    except Exception as e:
+        print(f"\n✗ Error processing {os.path.basename(jpg_path)}: {e}")
+        return None
+
+
+def scan_dataset(data_dir):
+    """
+    Walk through the PCBData directory once, parsing label files and
+    reading the matching images as raw bytes.
+
+    A single traversal emits both record kinds, halving the directory
+    syscalls of the previous label pass + image pass. Image reads are
+    dispatched to a thread pool: disk I/O releases the GIL, so the work
+    scales across cores.
+
+    Args:
+        data_dir: Path to PCBData directory
+
+    Returns:
+        Tuple of (labels_df, images_df) where labels_df has columns
+        filename, xmin, ymin, xmax, ymax, class and images_df has
+        columns Filename, image_data (raw JPEG bytes, stored as BINARY)
+    """
     print("\n" + "="*80)
-    print("Step 1: Parsing Labels from PCBData")
+    print("Step 1: Scanning PCBData (labels and images)")
     print("="*80)
-    
+
     if not os.path.exists(data_dir):
         print(f"✗ Error: Data directory not found: {data_dir}")
         sys.exit(1)
-    
-    labels = []
-    file_count = 0
-    
-    # Walk through the PCBData directory structure
+
+    label_entries = []
+    image_entries = []
+
+    # Walk through the PCBData directory structure with os.scandir, whose
+    # DirEntry objects carry the file type from getdents64 and avoid a
+    # separate stat per entry
     # Structure: PCBData/group44000/44000/*.jpg and group44000/44000_not/*.txt
-    for group_folder in sorted(os.listdir(data_dir)):
-        group_path = os.path.join(data_dir, group_folder)
-        
-        if not os.path.isdir(group_path):
+    for group_entry in sorted(os.scandir(data_dir), key=lambda e: e.name):
+        if not group_entry.is_dir(follow_symlinks=False):
             continue
-        
-        for sub_folder in sorted(os.listdir(group_path)):
-            # Skip the "_not" folders in this pass
-            if sub_folder.endswith("_not"):
+
+        for sub_entry in sorted(os.scandir(group_entry.path), key=lambda e: e.name):
+            # Skip the "_not" folders; they are visited via their image folder
+            if sub_entry.name.endswith("_not"):
                 continue
-            
-            sub_folder_path = os.path.join(group_path, sub_folder)
-            
-            if not os.path.isdir(sub_folder_path):
+
+            if not sub_entry.is_dir(follow_symlinks=False):
                 continue
-            
+
             # Find corresponding *_not folder for labels
-            folder_not = os.path.join(group_path, sub_folder + "_not")
-            
+            folder_not = sub_entry.path + "_not"
+
             if not os.path.exists(folder_not):
                 continue
-            
+
             # Process files in the subfolder
-            for file_name in sorted(os.listdir(sub_folder_path)):
-                if file_name.endswith("_test.jpg"):
+            for file_entry in sorted(os.scandir(sub_entry.path), key=lambda e: e.name):
+                if file_entry.name.endswith("_test.jpg"):
                     # Get the base filename without _test.jpg
-                    filename_base = file_name.replace("_test.jpg", "")
-                    
+                    filename_base = file_entry.name.replace("_test.jpg", "")
+
                     # Find corresponding .txt label file
                     txt_name = filename_base + ".txt"
                     txt_path = os.path.join(folder_not, txt_name)
-                    
+
                     if os.path.exists(txt_path):
-                        # Parse the label file
-                        with open(txt_path, 'r') as f:
-                            for line in f:
-                                parts = line.strip().split()
-                                if len(parts) == 5:
-                                    xmin, ymin, xmax, ymax, class_id = parts
-                                    labels.append({
-                                        'filename': filename_base,
-                                        'xmin': float(xmin),
-                                        'ymin': float(ymin),
-                                        'xmax': float(xmax),
-                                        'ymax': float(ymax),
-                                        'class': int(class_id)
-                                    })
-                        
-                        file_count += 1
-                        if file_count % 10 == 0:
-                            print(f"  Processed {file_count} label files...", end='\r')
-    
-    print(f"\n✓ Parsed {file_count} label files with {len(labels)} bounding boxes")
-    
-    # Create DataFrame
-    labels_df = pd.DataFrame(labels)
-    return labels_df
+                        # The image is labelled, so queue both for parsing
+                        label_entries.append((txt_path, filename_base))
+                        image_entries.append((filename_base, file_entry.path))
+
+    # Parse all label files with the pandas C parser instead of a Python
+    # line loop with per-value float()/int() conversions
+    labels_df = _parse_label_files(label_entries)
+
+    print(f"✓ Parsed {len(label_entries)} label files with {len(labels_df)} bounding boxes")
+
+    # Read image bytes in parallel
+    max_workers = min(32, (os.cpu_count() or 1) * 4)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        images = [result for result in executor.map(_read_image, image_entries) if result is not None]
+
+    print(f"✓ Read {len(images)} images")
+
+    images_df = pd.DataFrame(images)
+    return labels_df, images_df
 
 
-def read_and_encode_images(data_dir, label_filenames):
+def write_table(session, df, table_name):
     """
-    Read image files and encode them as base64 strings.
-    
+    Write a DataFrame to a Snowflake table, replacing any existing table.
+
+    Small frames go through session.write_pandas. Frames whose parquet
+    payload exceeds PARQUET_THRESHOLD_BYTES are uploaded to the user stage
+    once and loaded with COPY INTO, which avoids the chunked insert path
+    of write_pandas on base64-inflated image rows.
+
     Args:
-        data_dir: Path to PCBData directory
-        label_filenames: Set of filenames (without extension) that have labels
-    
-    Returns:
-        pandas DataFrame with columns: Filename, image_data
+        session: Snowflake session
+        df: pandas DataFrame to write
+        table_name: Name of the target table
     """
-    print("\n" + "="*80)
-    print("Step 2: Reading and Encoding Images")
-    print("="*80)
-    
-    images = []
-    processed_count = 0
-    
-    # Walk through directory structure to find image files
-    for group_folder in sorted(os.listdir(data_dir)):
-        group_path = os.path.join(data_dir, group_folder)
-        
-        if not os.path.isdir(group_path):
-            continue
-        
-        for sub_folder in sorted(os.listdir(group_path)):
-            # Skip the "_not" folders
-            if sub_folder.endswith("_not"):
-                continue
-            
-            sub_folder_path = os.path.join(group_path, sub_folder)
-            
-            if not os.path.isdir(sub_folder_path):
-                continue
-            
-            # Process image files
-            for file_name in sorted(os.listdir(sub_folder_path)):
-                if file_name.endswith("_test.jpg"):
-                    filename_base = file_name.replace("_test.jpg", "")
-                    
-                    # Only process images that have corresponding labels
-                    if filename_base in label_filenames:
-                        jpg_path = os.path.join(sub_folder_path, file_name)
-                        
-                        try:
-                            # Read and encode image
-                            with open(jpg_path, 'rb') as f:
-                                base64_string = base64.b64encode(f.read()).decode('utf-8')
-                                images.append({
-                                    'Filename': filename_base + "_test",
-                                    'image_data': base64_string
-                                })
-                            
-                            processed_count += 1
-                            if processed_count % 10 == 0:
-                                print(f"  Processed {processed_count} images...", end='\r')
-                        except Exception as e:
-                            print(f"\n✗ Error processing {file_name}: {e}")
-    
-    print(f"\n✓ Encoded {processed_count} images")
-    
-    # Create DataFrame
-    images_df = pd.DataFrame(images)
-    return images_df
+    buf = BytesIO()
+    df.to_parquet(buf, compression='snappy', engine='pyarrow', index=False)
+
+    if buf.tell() < PARQUET_THRESHOLD_BYTES:
+        session.write_pandas(
+            df,
+            table_name,
+            auto_create_table=True,
+            overwrite=True,
+            quote_identifiers=False
+        )
+        return
+
+    buf.seek(0)
+    stage_path = f'@~/stage_{table_name.lower()}.parquet'
+    session.file.put_stream(buf, stage_path, auto_compress=False, overwrite=True)
+    session.sql("CREATE FILE FORMAT IF NOT EXISTS parquet_fmt TYPE = PARQUET").collect()
+    # IGNORE_CASE yields uppercase, case-insensitive column identifiers,
+    # matching what write_pandas(quote_identifiers=False) creates
+    session.sql(f"""
+        CREATE OR REPLACE TABLE {table_name} USING TEMPLATE (
+            SELECT ARRAY_AGG(OBJECT_CONSTRUCT(*))
+            FROM TABLE(INFER_SCHEMA(LOCATION=>'{stage_path}', FILE_FORMAT=>'parquet_fmt', IGNORE_CASE=>TRUE))
+        )
+    """).collect()
+    session.sql(f"""
+        COPY INTO {table_name} FROM {stage_path}
+        FILE_FORMAT = (TYPE = PARQUET)
+        MATCH_BY_COLUMN_NAME = CASE_INSENSITIVE
+    """).collect()
+    session.sql(f"REMOVE {stage_path}").collect()
 
 
 def create_tables(session, labels_df, images_df):
@@ -249,26 +418,20 @@ def create_tables(session, labels_df, images_df):
         images_df: DataFrame with image data
     """
     print("\n" + "="*80)
-    print("Step 3: Creating Snowflake Tables")
+    print("Step 2: Creating Snowflake Tables")
     print("="*80)
     
     # 1. Write LABELS_TRAIN table
     print(f"  Writing LABELS_TRAIN table ({len(labels_df)} records)...")
-    session.write_pandas(
-        labels_df,
-        "LABELS_TRAIN",
-        auto_create_table=True,
-        overwrite=True,
-        quote_identifiers=False
-    )
+    write_table(session, labels_df, "LABELS_TRAIN")
     print(f"✓ Created LABELS_TRAIN table")
     
     # 2. Merge labels with images
     print("  Merging labels with images...")
-    # Prepare labels DataFrame for merging
-    labels_for_merge = labels_df.copy()
-    labels_for_merge['Filename'] = labels_for_merge['filename'] + "_test"
-    labels_for_merge = labels_for_merge.drop(columns=['filename'])
+    # Prepare labels DataFrame for merging; rename shares the underlying
+    # data and only the rewritten key column is allocated fresh
+    labels_for_merge = labels_df.rename(columns={'filename': 'Filename'}, copy=False)
+    labels_for_merge['Filename'] = labels_for_merge['Filename'] + "_test"
     
     # Merge on Filename
     merged_df = pd.merge(labels_for_merge, images_df, how='inner', on='Filename')
@@ -280,37 +443,21 @@ def create_tables(session, labels_df, images_df):
     
     # 3. Write train_images_labels table
     print(f"  Writing train_images_labels table ({len(merged_df)} records)...")
-    session.write_pandas(
-        merged_df,
-        "train_images_labels",
-        auto_create_table=True,
-        overwrite=True,
-        quote_identifiers=False
-    )
+    write_table(session, merged_df, "train_images_labels")
     print(f"✓ Created train_images_labels table")
     
     # 4. Split dataset 90/10 and create training_data and test_data tables
+    # Split on row indices so the two shuffled halves are sliced out of
+    # merged_df one at a time instead of being materialized up front
     print("  Splitting dataset: 90% train, 10% test...")
-    train_df, test_df = train_test_split(merged_df, test_size=0.1, random_state=42)
-    
-    print(f"  Writing training_data table ({len(train_df)} records)...")
-    session.write_pandas(
-        train_df,
-        "training_data",
-        auto_create_table=True,
-        overwrite=True,
-        quote_identifiers=False
-    )
+    idx_train, idx_test = train_test_split(np.arange(len(merged_df)), test_size=0.1, random_state=42)
+
+    print(f"  Writing training_data table ({len(idx_train)} records)...")
+    write_table(session, merged_df.iloc[idx_train], "training_data")
     print(f"✓ Created training_data table")
-    
-    print(f"  Writing test_data table ({len(test_df)} records)...")
-    session.write_pandas(
-        test_df,
-        "test_data",
-        auto_create_table=True,
-        overwrite=True,
-        quote_identifiers=False
-    )
+
+    print(f"  Writing test_data table ({len(idx_test)} records)...")
+    write_table(session, merged_df.iloc[idx_test], "test_data")
     print(f"✓ Created test_data table")
 
 
@@ -329,14 +476,10 @@ def main():
     session = create_session(args.connection)
     
     try:
-        # Step 1: Parse labels from PCBData
-        labels_df = find_and_parse_labels(args.data_dir)
-        
-        # Step 2: Read and encode images
-        label_filenames = set(labels_df['filename'].unique())
-        images_df = read_and_encode_images(args.data_dir, label_filenames)
-        
-        # Step 3: Create Snowflake tables
+        # Step 1: Parse labels and encode images in a single traversal
+        labels_df, images_df = scan_dataset(args.data_dir)
+
+        # Step 2: Create Snowflake tables
         create_tables(session, labels_df, images_df)
         
         print("\n" + "="*80)
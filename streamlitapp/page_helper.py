@@ -1,14 +1,25 @@
 import base64, io
+from pathlib import Path
+import streamlit as st
 from PIL import Image
 
 
+@st.cache_data(show_spinner=False)
 def get_image(image_name):
     pil_im = Image.open(image_name)
     b = io.BytesIO()
     pil_im.save(b, 'png')
     img_bytes = b.getvalue()
-    
+
     content = base64.b64encode(img_bytes).decode()
     img = f"data:image/png;base64,{content}"
 
-    return img
\ No newline at end of file
+    return img
+
+
+@st.cache_data(show_spinner=False)
+def get_image_uri(image_name):
+    mime_type = image_name.split('.')[-1].lower()
+    content = base64.b64encode(Path(image_name).read_bytes()).decode()
+
+    return f"data:image/{mime_type};base64,{content}"
@@ -1,7 +1,7 @@
 import streamlit as st
 import snowflake.snowpark.functions as F
 import json
-from page_helper import get_image
+from page_helper import get_image, get_image_uri
 import altair as alt
 import pandas as pd
 import time
@@ -26,12 +26,8 @@ st.title(":blue[Manufacturing - PCB Defect Detection and Classification - Setup]
 
 st.markdown("---")
 image_filename = 'pcb.png'
-mime_type = image_filename.split('.')[-1:][0].lower()        
-with open(image_filename, "rb") as f:
-    content_bytes = f.read()
-content_b64encoded = base64.b64encode(content_bytes).decode()
-image_string = f'data:image/{mime_type};base64,{content_b64encoded}'
-st.image(image_string, width=500)
+# Static image; encoded once and cached across reruns
+st.image(get_image_uri(image_filename), width=500)
 
 def display_connection_info():
     with st.expander("Snowflake Connection Information", expanded=True):
@@ -65,6 +61,7 @@ st.markdown("---")
 
 st.write("The demo uses the following functionality: Snowpark Container Services")
 
+# Pull only the image names; the base64 payloads stay in Snowflake and a
+# single image can be fetched by name when one is actually selected
 df_imgsrc = session.table("IMAGES_LANDING")
-snf_df = df_imgsrc.select("IMAGE_NAME", "BASE64BYTES").distinct()
-df = snf_df.to_pandas()
+names_df = df_imgsrc.select("IMAGE_NAME").distinct().to_pandas()
@@ -1,7 +1,7 @@
 import streamlit as st
 from snowflake.snowpark.context import get_active_session
 from snowflake.ml.registry import Registry
-from page_helper import get_image
+from page_helper import get_image, get_image_uri
 import snowflake.snowpark.functions as F
 import json
 import altair as alt
@@ -13,23 +13,50 @@ from io import BytesIO
 from PIL import Image
 import matplotlib.pyplot as plt
 import matplotlib.patches as patches
+from matplotlib.collections import PatchCollection
 import os
-import threading
 import zipfile
-import fcntl
 import numpy as np
+import pyarrow as pa
+
+# SIMD-accelerated base64 encoder (AVX2/AVX-512 runtime dispatch);
+# fall back to the stdlib encoder if pybase64 is not installed
+try:
+    from pybase64 import b64encode_as_string
+except ImportError:
+    def b64encode_as_string(data):
+        return base64.b64encode(data).decode('utf-8')
+
+# Rust-based JSON parser for the model output blobs; fall back to the
+# stdlib parser if orjson is not installed
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    json_loads = json.loads
 
 session = get_active_session()
 
 # Configure Streamlit layout
 st.set_page_config(layout="wide")
 
+
+@st.cache_resource(show_spinner=False)
+def _get_model_version(_session):
+    # Cached across reruns so the registry metadata queries run once per
+    # process; the leading underscore keeps Streamlit from hashing the session
+    reg = Registry(session=_session)
+    return reg.get_model("DEFECTDETECTIONMODEL").version("GENTLE_DONKEY_4")
+
 st.image(get_image("snowflakelogo/logo-sno-blue.png"), width=100)
 st.title(":blue[Computer Vision based Defect Detection and Classification]")
 st.markdown("---")
 
 image_filename = 'pcb.png'
 
+# Display an image; the file never changes, so the encoded data URI is
+# cached across reruns
+st.image(get_image_uri(image_filename), width=500)
+
 # Create table for image landing in Snowflake 
 session.sql(f"""
     CREATE TABLE IF NOT EXISTS IMAGES_LANDING (
@@ -38,112 +65,70 @@ session.sql(f"""
     )
 """).collect()
 
-# Display an image
-mime_type = image_filename.split('.')[-1].lower()
-with open(image_filename, "rb") as f:
-    content_bytes = f.read()
-content_b64encoded = base64.b64encode(content_bytes).decode()
-image_string = f'data:image/{mime_type};base64,{content_b64encoded}'
-st.image(image_string, width=500)
-
 # Ensure the session state exists
 if 'images_loaded' not in st.session_state:
-    parent_directory = os.getcwd()
-    zip_file_path = os.path.join(parent_directory, "detect.zip")
-    extracted = os.path.join(parent_directory, "detect")
-
-    class FileLock:
-        def __enter__(self):
-            self._lock = threading.Lock()
-            self._lock.acquire()
-            self._fd = open('/tmp/lockfile.LOCK', 'w+')
-            fcntl.lockf(self._fd, fcntl.LOCK_EX)
-
-        def __exit__(self, type, value, traceback):
-            self._fd.close()
-            self._lock.release()
+    zip_file_path = os.path.join(os.getcwd(), "detect.zip")
 
     # Truncate the IMAGES_LANDING table
     session.sql(f"TRUNCATE TABLE IMAGES_LANDING").collect()
 
-    # Extract the zip file containing images
-    with FileLock():
-        if not os.path.isdir(extracted):
-            with zipfile.ZipFile(zip_file_path, 'r') as myzip:
-                myzip.extractall(parent_directory)
-
-    # Change to the extracted directory and process image files
-    os.chdir(extracted)
-    extracted_files = os.listdir()
-    st.session_state.image_data = []  # Initialize image data storage
-
-    for filename in extracted_files:
-        if filename.lower().endswith((".jpg", ".jpeg", ".png", ".gif")):
-            image_path = os.path.join(extracted, filename)
-            with open(image_path, "rb") as image_file:
-                image_b64 = base64.b64encode(image_file.read()).decode("utf-8")
-                
-            # Create a DataFrame and upload image data to Snowflake
-            pdf_base64 = pd.DataFrame({
-                'IMAGE_NAME': [filename],  
-                'BASE64BYTES': [image_b64]
-            })
-            session.write_pandas(pdf_base64, 'IMAGES_LANDING', quote_identifiers=False, auto_create_table=True, overwrite=False)
-
-            # Store image names and their base64 representations
-            st.session_state.image_data.append({
-                'IMAGE_NAME': filename,
-                'BASE64BYTES': image_b64
-            })
-
-    # Clean up: Remove extracted files and directories
-    for filename in extracted_files:
-        os.remove(filename)
-    os.rmdir(extracted)
-    os.chdir(parent_directory)
+    # Read each image straight out of the zip and encode in memory; nothing
+    # is materialized on disk, so no extraction lock or cleanup is needed
+    names = []
+    b64s = []
+
+    with zipfile.ZipFile(zip_file_path, 'r') as myzip:
+        for info in myzip.infolist():
+            if info.filename.lower().endswith((".jpg", ".jpeg", ".png", ".gif")):
+                # Store image names and their base64 representations
+                names.append(os.path.basename(info.filename))
+                b64s.append(b64encode_as_string(myzip.read(info)))
+
+    # Upload all image data to Snowflake in a single bulk write instead of
+    # one write_pandas (PUT + COPY) round trip per image
+    if names:
+        pdf_base64 = pd.DataFrame({'IMAGE_NAME': names, 'BASE64BYTES': b64s})
+        session.write_pandas(pdf_base64, 'IMAGES_LANDING', quote_identifiers=False, auto_create_table=True, overwrite=False, use_logical_type=True)
+
+    # Keep the images as a compact Arrow table; a list of dicts adds
+    # ~200 bytes of per-entry overhead on top of the base64 payload
+    st.session_state.image_table = pa.table({'IMAGE_NAME': names, 'BASE64BYTES': b64s})
 
     st.session_state.images_loaded = True  # Mark images as loaded
 
 st.markdown("---")
 
 st.markdown(":green[Choose an image file from the dropdown]")
-image_df = pd.DataFrame(st.session_state.image_data)
+image_table = st.session_state.image_table
+image_names = image_table.column('IMAGE_NAME').to_pylist()
 
-if image_df.empty:
+if not image_names:
     st.write("No images available. Ingest data first")
 else:
-    imagesrc = st.selectbox("Image Name", image_df['IMAGE_NAME'], 0)
-    
-    filtered_row = image_df[image_df['IMAGE_NAME'] == imagesrc]
+    imagesrc = st.selectbox("Image Name", image_names, 0)
     selected_image_name = imagesrc
-    if filtered_row.empty:
-        st.write("Selected image not found.")
-    else:
-        selected_image = filtered_row.iloc[0]['BASE64BYTES']
-        
-        st.markdown("---")
+    selected_image = image_table.column('BASE64BYTES')[image_names.index(imagesrc)].as_py()
 
-        st.write(
-            """
-            Image Base64 encoding is a way to represent image data as a text string that can be easily stored and transmitted. 
-            In this encoding, the binary image data is converted into a sequence of characters using a specific character set, which typically includes alphanumeric characters, plus a few special characters such as '+', '/', and '='.
-            It's also used for data transmission in protocols like HTTP (for inline images) and in data URI schemes.
-            """
-        )
-        
-        img = f'data:image/jpg;base64,{selected_image}'
-        st.markdown(":green[Raw Image]")
-        st.image(img, width=500)
+    st.markdown("---")
+
+    st.write(
+        """
+        Image Base64 encoding is a way to represent image data as a text string that can be easily stored and transmitted.
+        In this encoding, the binary image data is converted into a sequence of characters using a specific character set, which typically includes alphanumeric characters, plus a few special characters such as '+', '/', and '='.
+        It's also used for data transmission in protocols like HTTP (for inline images) and in data URI schemes.
+        """
+    )
+
+    img = f'data:image/jpg;base64,{selected_image}'
+    st.markdown(":green[Raw Image]")
+    st.image(img, width=500)
 
 st.title(":blue[Defect Detection and Classification]")
 if st.button("Click button to ingest images and carry inference using custom trained RCNN Object Detection PyTorch Model"):
-    with st.spinner("Load custom trained model from Snowflake Model Registry"):            
-        reg = Registry(session=session)
-        m = reg.get_model("DEFECTDETECTIONMODEL")
-        mv = m.version("GENTLE_DONKEY_4")
+    with st.spinner("Load custom trained model from Snowflake Model Registry"):
+        mv = _get_model_version(session)
 
-        filtered_row = image_df[image_df['IMAGE_NAME'] == imagesrc]
-        base64_image = filtered_row.iloc[0]['BASE64BYTES']
+        base64_image = image_table.column('BASE64BYTES')[image_names.index(imagesrc)].as_py()
         image_data_df = pd.DataFrame({'IMAGE_DATA': [base64_image]})
 
         remote_prediction = mv.run(image_data_df, function_name="predict")
@@ -174,51 +159,47 @@ if st.button("Click button to ingest images and carry inference using custom tra
         # Combine the image data and remote prediction DataFrames
         combined_df = pd.concat([image_data_df, remote_prediction], axis=1)
         
-        # Create a list to store data that will be written to a final DataFrame
-        rows = []
-        
+        # Accumulate detections as parallel columns instead of one dict per
+        # row; the image payload stays in IMAGES_LANDING keyed by filename,
+        # so it is not replicated once per box
+        det_filenames = []
+        det_labels = []
+        det_boxes = []
+        det_scores = []
+
+
         # Iterate through each row in the combined DataFrame
         for index, row in combined_df.iterrows():
             # Convert the 'output' column JSON string into a dictionary
-            output_data = json.loads(row['output'])  # Convert JSON string to dict
-        
+            output_data = json_loads(row['output'])  # Convert JSON string to dict
+
             # Extract the boxes, labels, and scores from the JSON data
             if 'boxes' in output_data and 'labels' in output_data and 'scores' in output_data:
                 boxes = output_data['boxes']
                 labels = output_data['labels']
-                scores = output_data['scores']
-        
+                scores = np.asarray(output_data['scores'], dtype=np.float32)
+
                 # Decode the image data
                 image_data = base64.b64decode(row['IMAGE_DATA'])
                 image = Image.open(io.BytesIO(image_data)).convert("RGB")  # Convert to RGB
-        
+
                 # Limit to top 5 classes based on scores
-                if len(scores) > 0:
-                    # Create a DataFrame to manage boxes, labels, and scores
-                    data = pd.DataFrame({
-                        'box': boxes,
-                        'label': labels,
-                        'score': scores
-                    })
-        
-                    # Get the top 5 entries based on scores
-                    top_classes = data.nlargest(5, 'score')
-        
+                if scores.size > 0:
+                    # O(N) top-k via argpartition, then sort just the k winners
+                    k = min(5, scores.size)
+                    top_idx = np.argpartition(-scores, k - 1)[:k]
+                    top_idx = top_idx[np.argsort(-scores[top_idx])]
+
                     # Extract the corresponding boxes, labels, and scores
-                    top_boxes = top_classes['box'].tolist()
-                    top_labels = top_classes['label'].tolist()
-                    top_scores = top_classes['score'].tolist()
+                    top_boxes = [boxes[i] for i in top_idx]
+                    top_labels = [labels[i] for i in top_idx]
+                    top_scores = scores[top_idx].tolist()
         
                     # Store each of the top 5 predictions as a separate row
-                    for i in range(len(top_boxes)):
-                        rows.append({ 
-                            'filename':imagesrc,
-                            'image_data': row['IMAGE_DATA'],  # Same image data for all 5 rows
-                            'output': row['output'],  # JSON output from the model
-                            'label': top_labels[i],  # Label for the specific box
-                            'box': top_boxes[i],  # Bounding box coordinates
-                            'score': top_scores[i]  # Score of the specific box
-                        })
+                    det_filenames.extend([imagesrc] * len(top_boxes))
+                    det_labels.extend(top_labels)
+                    det_boxes.extend(top_boxes)
+                    det_scores.extend(top_scores)
         
                     # Display the image with bounding boxes and labels
                     
@@ -229,18 +210,18 @@ if st.button("Click button to ingest images and carry inference using custom tra
                     fig, ax = plt.subplots(figsize=(4, 4))
                     ax.imshow(img_np)
                 
-                    # Plot each bounding box with its corresponding label and score
+                    # Draw all bounding boxes as one PatchCollection so
+                    # matplotlib renders a single artist instead of one per box
+                    rects = [
+                        patches.Rectangle((xmin, ymin), xmax - xmin, ymax - ymin)
+                        for xmin, ymin, xmax, ymax in top_boxes
+                    ]
+                    ax.add_collection(PatchCollection(rects, linewidth=2, edgecolor='r', facecolor='none'))
+
+                    # One text label per box
                     for label, box, score in zip(top_labels, top_boxes, top_scores):
-                        
-                        xmin, ymin, xmax, ymax = box
-                        
-                        # Class label for the bounding box
                         class_label = classes_la[label]
-                
-                        # Create a Rectangle patch
-                        rect = patches.Rectangle((xmin, ymin), xmax - xmin, ymax - ymin, linewidth=2, edgecolor='r', facecolor='none')
-                        ax.text(xmin, ymin, f"{class_label}: {score:.2f}", verticalalignment='top', color='red', fontsize=13, weight='bold')
-                        ax.add_patch(rect)
+                        ax.text(box[0], box[1], f"{class_label}: {score:.2f}", verticalalignment='top', color='red', fontsize=13, weight='bold')
                 
                     plt.axis('off')  # Hide axis
                     st.pyplot(fig)
@@ -250,27 +231,26 @@ if st.button("Click button to ingest images and carry inference using custom tra
             else:
                 print("Missing keys 'boxes', 'labels', or 'scores' in the output data.")
         
-        # Create the final DataFrame with the collected rows (one row per label/box/score)
-        final_df = pd.DataFrame(rows)
-        
-        # Write the DataFrame to the Snowflake table
-        combined_spdf = session.create_dataframe(final_df)
-       
-        combined_spdf.write.save_as_table("DETECTION_OUTPUTS",mode="overwrite")
-        s = session.sql(f""" create TABLE if not exists DETECTIONS (
-        filename VARCHAR(16777216),
-image_data VARCHAR(16777216),
-output VARCHAR(16777216),
-label NUMBER(38,0),
-box VARIANT,
-score FLOAT
-); """).collect()
-        a = session.sql(f""" INSERT INTO DETECTIONS (filename,image_data, output, label,box,score)
-SELECT "filename","image_data", "output", "label","box","score"
-FROM DETECTION_OUTPUTS WHERE "filename" = '{imagesrc}' """).collect()
-        
+        # Create the final DataFrame from the columnar accumulators (one row
+        # per label/box/score)
+        final_df = pd.DataFrame({
+            'filename': det_filenames,
+            'label': np.asarray(det_labels, dtype=np.int32),
+            'box': det_boxes,
+            'score': np.asarray(det_scores, dtype=np.float32)
+        })
+
+        # Append straight to DETECTIONS in one round trip; this replaces the
+        # DETECTION_OUTPUTS staging table, the CREATE TABLE IF NOT EXISTS
+        # and the INSERT...SELECT that used to follow
+        session.write_pandas(final_df, 'DETECTIONS', auto_create_table=True, overwrite=False, quote_identifiers=False, use_logical_type=True)
+
 
-            
         st.markdown("---")
-        pd_df=session.table("DETECTIONS").to_pandas()
+        # Fetch only the rows for the selected image rather than the whole
+        # detection history; the bind parameter keeps the query plan-cached
+        pd_df = session.sql(
+            "SELECT filename, label, box, score FROM DETECTIONS WHERE filename = ?",
+            params=[imagesrc]
+        ).to_pandas()
         st.write(pd_df)
\ No newline at end of file
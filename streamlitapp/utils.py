@@ -1,7 +1,9 @@
 import streamlit as st
 import snowflake.snowpark.functions as F
 import json
-import logging ,sys ,os 
+import logging ,sys ,os
+import subprocess
+from collections import deque
 from pathlib import Path
 from page_helper import get_image
 import altair as alt
@@ -53,34 +55,34 @@ def list_stage(p_stage :str):
 
 def exec_python_script(p_pyscript: str ,p_cache_id) -> bool:
     '''
-        Executes a python script and writes the output to a textbox.
+        Executes a python script, streaming the output to a textbox.
     '''
-    script_executed = False
     logger.info(f'Executing python script: {p_pyscript} ...')
-    # Capture script output.
-    script_output = []
+    # Capture script output in a ring buffer so long-running scripts
+    # cannot grow memory without bound.
+    script_output = deque(maxlen=10_000)
+    placeholder = st.empty()
+
     process = subprocess.Popen(
         ['python'
         ,p_pyscript]
         ,stdout=subprocess.PIPE
-        ,universal_newlines=True)
+        ,stderr=subprocess.STDOUT
+        ,bufsize=1
+        ,text=True)
 
-    while True:
-        output = process.stdout.readline()
+    # Stream lines as they arrive, refreshing the textbox periodically
+    # instead of buffering everything until the process exits.
+    for line_no, output in enumerate(iter(process.stdout.readline, '')):
         script_output.append(output)
-        return_code = process.poll()
-        
-        if return_code is not None:
-            script_output.append(f'RETURN CODE: {return_code} \n')
-            script_executed = True
-
-            # Process has finished, read rest of the output 
-            for output in process.stdout.readlines():
-                script_output.append(output)
+        if line_no % 25 == 0:
+            placeholder.code(''.join(script_output))
 
-            break
+    return_code = process.wait()
+    script_output.append(f'RETURN CODE: {return_code} \n')
 
     script_output.append('\n --- Finished executing script ---')
-    st.session_state[p_cache_id] = script_output
+    placeholder.code(''.join(script_output))
+    st.session_state[p_cache_id] = list(script_output)
 
-    return script_executed
\ No newline at end of file
+    return True
\ No newline at end of file